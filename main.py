@@ -1,74 +1,102 @@
+import atexit
 import re
 import sqlite3
+import time
 from datetime import datetime
 import tkinter as tk
 from tkinter import ttk, messagebox
-import threading
 
 FIRST_KEY_ID = 1
 LAST_KEY_ID = 100
 
+# Built once so every status refresh walks the same tuple in stable order
+_ALL_KEY_IDS = tuple(range(FIRST_KEY_ID, LAST_KEY_ID + 1))
+
+# Rows kept in the status Treeview at a time (visible rows plus scroll buffer)
+STATUS_WINDOW_SIZE = 30
+
 DATABASE_NAME = 'library_key_management.db'
 TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
-# Adapter: Convert datetime to string when storing in the database
-def adapt_datetime(dt):
-    return dt.strftime(TIME_FORMAT)
-
-# Converter: Convert string back to datetime when retrieving from the database
-def convert_datetime(s):
-    return datetime.strptime(s.decode(), TIME_FORMAT)
+# Compiled once at import so validation doesn't hit re's cache on every scan
+_STUDENT_ID_RE = re.compile(r'^\d{8}$')
 
-sqlite3.register_adapter(datetime, adapt_datetime)
-sqlite3.register_converter("timestamp", convert_datetime)
+_MAX_KEY_ID_LEN = len(str(LAST_KEY_ID))
 
 class LibraryKeyManagement:
     def __init__(self, db_name=DATABASE_NAME):
         self.current_student = None
-        self.conn = sqlite3.connect(db_name, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False)
-        self.cursor = self.conn.cursor()
+        self.conn = sqlite3.connect(db_name, check_same_thread=False)
+        self._tune_connection(self.conn)
 
         # We no longer initialize keys in memory; they will be loaded from the database
         self.available_keys = set()
         self.borrowed_keys = set()
+        self.borrowed_by = {}  # key_id -> student_id for borrowed keys
+        self.student_to_key = {}  # inverse map: student_id -> borrowed key_id
+
+        # Row ids tracked in RAM so updates hit the primary key directly
+        self._last_entry_id = None
+        self._borrow_row_id = {}
 
         self._create_tables()
         self._load_keys_from_db()
 
+        # Close deterministically at exit; __del__ is unreliable during
+        # interpreter shutdown and would leave the WAL file behind
+        atexit.register(self._close)
+
+    @staticmethod
+    def _tune_connection(conn):
+        """Apply WAL mode and pragma tuning so readers don't block the writer."""
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA cache_size=-8000')
+        conn.execute('PRAGMA busy_timeout=5000')
+
     def _create_tables(self):
         # Create the tables if they don't exist
-        self.cursor.execute('''
+        self.conn.execute('''
         CREATE TABLE IF NOT EXISTS student_entries (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             student_id TEXT NOT NULL,
-            entry_time TIMESTAMP NOT NULL,
+            entry_time INTEGER NOT NULL,
             key_id INTEGER DEFAULT NULL,
             key_status TEXT DEFAULT NULL
         )
         ''')
 
-        self.cursor.execute('''
+        # Indexes so lookups by student or key avoid a full table scan
+        self.conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_se_student_time ON student_entries(student_id, entry_time DESC)
+        ''')
+        self.conn.execute('''
+        CREATE INDEX IF NOT EXISTS idx_se_keyid_status ON student_entries(key_id, key_status)
+        ''')
+
+        self.conn.execute('''
         CREATE TABLE IF NOT EXISTS key_status (
             key_id INTEGER PRIMARY KEY,
             status TEXT NOT NULL CHECK (status IN ('Available', 'Borrowed'))
         )
         ''')
 
-        # Initialize the key_status table with keys in the range if empty
-        self.cursor.execute('SELECT COUNT(*) FROM key_status')
-        count = self.cursor.fetchone()[0]
+        # Initialize the key_status table with keys in the range if empty,
+        # seeding in one explicit transaction without building the tuple list
+        count = self.conn.execute('SELECT COUNT(*) FROM key_status').fetchone()[0]
         if count == 0:
-            self.cursor.executemany('''
-            INSERT INTO key_status (key_id, status)
-            VALUES (?, 'Available')
-            ''', [(key_id,) for key_id in range(FIRST_KEY_ID, LAST_KEY_ID + 1)])
+            with self.conn:
+                self.conn.executemany('''
+                INSERT INTO key_status (key_id, status)
+                VALUES (?, 'Available')
+                ''', ((key_id,) for key_id in _ALL_KEY_IDS))
 
         self.conn.commit()
 
     def _load_keys_from_db(self):
         """Load available and borrowed keys from the key_status table into RAM."""
-        self.cursor.execute('SELECT key_id, status FROM key_status')
-        keys = self.cursor.fetchall()
+        keys = self.conn.execute('SELECT key_id, status FROM key_status').fetchall()
 
         for key_id, status in keys:
             if status == 'Borrowed':
@@ -76,28 +104,23 @@ class LibraryKeyManagement:
             elif status == 'Available':
                 self.available_keys.add(key_id)
 
-    def _update_key_status_in_db(self, key_id, status):
-        """Perform the key update in the database asynchronously."""
-        def update():
-            with sqlite3.connect(DATABASE_NAME, detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False) as conn:
-                cursor = conn.cursor()
-                cursor.execute('''
-                INSERT INTO key_status (key_id, status) 
-                VALUES (?, ?)
-                ON CONFLICT(key_id) DO UPDATE SET status = excluded.status
-                ''', (key_id, status))
-                conn.commit()
+        # Map borrowed keys to their borrowers once; kept up to date in RAM
+        rows = self.conn.execute('''
+        SELECT key_id, student_id FROM student_entries
+        WHERE key_status = 'Borrowed'
+        ''').fetchall()
+        for key_id, student_id in rows:
+            self.borrowed_by[key_id] = student_id
+            self.student_to_key[student_id] = key_id
 
-        # Run the database update in a separate thread
-        threading.Thread(target=update, daemon=True).start()
-    
     def _process_student_id(self, student_id):
         self.current_student = student_id
-        self.cursor.execute('''
+        cursor = self.conn.execute('''
         INSERT INTO student_entries (student_id, entry_time, key_id, key_status)
         VALUES (?, ?, NULL, NULL)
-        ''', (student_id, datetime.now()))
+        ''', (student_id, int(time.time())))
         self.conn.commit()
+        self._last_entry_id = cursor.lastrowid
         return f"Student {student_id} entered the library."
 
     def _process_key_id(self, key_id):
@@ -108,84 +131,108 @@ class LibraryKeyManagement:
         key_id = int(key_id)
 
         if key_id in self.borrowed_keys:
-            # Return the key
-            self.cursor.execute('''
-            UPDATE student_entries
-            SET key_id = ?, key_status = 'Returned'
-            WHERE id = (SELECT id FROM student_entries WHERE key_id = ? AND key_status = 'Borrowed' ORDER BY entry_time DESC LIMIT 1)
-            ''', (key_id, key_id))
-            self.conn.commit()
+            # Return the key: both updates commit atomically in one transaction
+            borrow_row_id = self._borrow_row_id.pop(key_id, None)
+            with self.conn:
+                if borrow_row_id is not None:
+                    # Point lookup on the primary key for keys borrowed this session
+                    self.conn.execute('''
+                    UPDATE student_entries
+                    SET key_id = ?, key_status = 'Returned'
+                    WHERE id = ?
+                    ''', (key_id, borrow_row_id))
+                else:
+                    # Key was borrowed in a previous session; fall back to the indexed lookup
+                    self.conn.execute('''
+                    UPDATE student_entries
+                    SET key_id = ?, key_status = 'Returned'
+                    WHERE id = (SELECT id FROM student_entries WHERE key_id = ? AND key_status = 'Borrowed' ORDER BY entry_time DESC LIMIT 1)
+                    ''', (key_id, key_id))
+                self.conn.execute('''
+                INSERT INTO key_status (key_id, status)
+                VALUES (?, 'Available')
+                ON CONFLICT(key_id) DO UPDATE SET status = excluded.status
+                ''', (key_id,))
 
             # Update in memory
             self.borrowed_keys.remove(key_id)
             self.available_keys.add(key_id)
-
-            # Async update in the database
-            self._update_key_status_in_db(key_id, 'Available')
+            borrower = self.borrowed_by.pop(key_id, None)
+            if borrower is not None:
+                self.student_to_key.pop(borrower, None)
 
             return f"Key {key_id} returned."
         
         if key_id in self.available_keys:
-            # Check if the student already has a borrowed key
-            self.cursor.execute('''
-            SELECT key_id FROM student_entries
-            WHERE student_id = ? AND key_status = 'Borrowed'
-            ''', (self.current_student,))
-            active_borrowed_key = self.cursor.fetchone()
-
-            if active_borrowed_key and active_borrowed_key[0] != key_id:
-                return f"Error: Student {self.current_student} already has key {active_borrowed_key[0]} borrowed. Return it before borrowing another key."
-
-            # Borrow the key
-            self.cursor.execute('''
-            UPDATE student_entries
-            SET key_id = ?, key_status = 'Borrowed'
-            WHERE id = (SELECT id FROM student_entries WHERE student_id = ? AND (key_status IS NULL OR key_status = 'Returned') ORDER BY entry_time DESC LIMIT 1)
-            ''', (key_id, self.current_student))
-            self.conn.commit()
+            # Check if the student already has a borrowed key (O(1) in RAM)
+            active_borrowed_key = self.student_to_key.get(self.current_student)
+
+            if active_borrowed_key is not None and active_borrowed_key != key_id:
+                return f"Error: Student {self.current_student} already has key {active_borrowed_key} borrowed. Return it before borrowing another key."
+
+            # Borrow the key: both updates commit atomically in one transaction
+            with self.conn:
+                self.conn.execute('''
+                UPDATE student_entries
+                SET key_id = ?, key_status = 'Borrowed'
+                WHERE id = ?
+                ''', (key_id, self._last_entry_id))
+                self.conn.execute('''
+                INSERT INTO key_status (key_id, status)
+                VALUES (?, 'Borrowed')
+                ON CONFLICT(key_id) DO UPDATE SET status = excluded.status
+                ''', (key_id,))
 
             # Update in memory
             self.available_keys.remove(key_id)
             self.borrowed_keys.add(key_id)
-
-            # Async update in the database
-            self._update_key_status_in_db(key_id, 'Borrowed')
+            self.borrowed_by[key_id] = self.current_student
+            self.student_to_key[self.current_student] = key_id
+            self._borrow_row_id[key_id] = self._last_entry_id
 
             return f"Key {key_id} borrowed by student {self.current_student}."
 
-    def get_status(self):
-        # Get keys with their status from the database
-        self.cursor.execute('''
-        SELECT student_id, key_id, key_status
-        FROM student_entries
-        WHERE key_status = 'Borrowed'
-        ''')
-        borrowed_keys = self.cursor.fetchall()
-
-        # Create a dictionary to keep track of borrowed keys with student IDs
-        borrowed_dict = {key[1]: key[0] for key in borrowed_keys}  # key_id -> student_id
-
-        # Create a list of all keys with their status (whether borrowed or available)
-        status_list = []
-        for key_id in range(FIRST_KEY_ID, LAST_KEY_ID + 1):
-            if key_id in borrowed_dict:
-                status_list.append((key_id, 'Borrowed', borrowed_dict[key_id]))  # Key is borrowed
-            else:
-                status_list.append((key_id, 'Available', None))  # Key is available
-
-        return status_list
+    def get_status(self, status_filter=None):
+        """Build the key status list from the in-memory maps; no SQL runs.
+
+        status_filter narrows the result to 'Borrowed' or 'Available' rows.
+        """
+        if status_filter == 'Borrowed':
+            return [(k, 'Borrowed', self.borrowed_by.get(k))
+                    for k in _ALL_KEY_IDS if k in self.borrowed_keys]
+        if status_filter == 'Available':
+            return [(k, 'Available', None)
+                    for k in _ALL_KEY_IDS if k not in self.borrowed_keys]
+        return [(k, 'Borrowed', self.borrowed_by.get(k)) if k in self.borrowed_keys
+                else (k, 'Available', None)
+                for k in _ALL_KEY_IDS]
 
     def get_log(self, limit=50):
-        self.cursor.execute('''
+        # id is monotonic in insertion order, so ordering by it walks the
+        # primary-key B-tree backwards instead of sorting on entry_time
+        cursor = self.conn.execute('''
         SELECT student_id, key_id, entry_time, key_status
         FROM student_entries
-        ORDER BY entry_time DESC
+        ORDER BY id DESC
         LIMIT ?
         ''', (limit,))
-        return self.cursor.fetchall()
-
-    def __del__(self):
-        self.conn.close()
+        # Format the epoch timestamps only for this 50-row display batch;
+        # rows written before the INTEGER migration are already text
+        return [
+            (student_id, key_id,
+             datetime.fromtimestamp(entry_time).strftime(TIME_FORMAT)
+             if isinstance(entry_time, (int, float)) else entry_time,
+             key_status)
+            for student_id, key_id, entry_time, key_status in cursor.fetchall()
+        ]
+
+    def _close(self):
+        """Checkpoint the WAL back into the database and close the connection."""
+        try:
+            self.conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # connection already closed
 
 class LibraryKeyManagementGUI:
     def __init__(self, master):
@@ -194,6 +241,21 @@ class LibraryKeyManagementGUI:
         self.system = LibraryKeyManagement()
 
         self.current_student_id = None  # Track the current student ID
+
+        # Virtualized status view: full data in RAM, only a window in the tree
+        self._status_data = []
+        self._status_offset = 0
+
+        # Debounce flag so bursts of scans collapse into one refresh
+        self._refresh_pending = False
+
+        # Last processed input, to skip re-sends from a stuck scanner
+        self._last_input = None
+        self._last_input_time = 0.0
+
+        # Key id parsed by is_valid_key_id, reused by process_input
+        self._parsed_key_id = None
+
         self.create_widgets()
 
         # Refresh the data on initial load
@@ -205,7 +267,8 @@ class LibraryKeyManagementGUI:
         input_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
 
         ttk.Label(input_frame, text="Scan ID:").grid(row=0, column=0, sticky=tk.W)
-        self.input_entry = ttk.Entry(input_frame, width=30)
+        self.input_var = tk.StringVar()
+        self.input_entry = ttk.Entry(input_frame, width=30, textvariable=self.input_var)
         self.input_entry.grid(row=0, column=1, sticky=(tk.W, tk.E))
         self.input_entry.focus()
 
@@ -221,7 +284,7 @@ class LibraryKeyManagementGUI:
 
         # Log tab
         log_frame = ttk.Frame(notebook, padding="10")
-        self.log_tree = self.create_treeview(log_frame, ['Student ID', 'Key ID', 'Time', 'Key Status'])
+        self.log_tree, _ = self.create_treeview(log_frame, ['Student ID', 'Key ID', 'Time', 'Key Status'])
         notebook.add(log_frame, text='Log')
 
         # Status tab
@@ -232,11 +295,16 @@ class LibraryKeyManagementGUI:
         filter_combobox = ttk.Combobox(status_frame, textvariable=self.filter_var, values=["All", "Borrowed", "Available"], state="readonly")
         filter_combobox.pack(padx=5, pady=5, fill=tk.X)  # Use pack here
 
-        filter_combobox.bind("<<ComboboxSelected>>", lambda event: self.refresh_data())
+        filter_combobox.bind("<<ComboboxSelected>>", lambda event: self.refresh_status())
 
-        self.status_tree = self.create_treeview(status_frame, ['Key ID', 'Status', 'Student ID'])
+        self.status_tree, self.status_scrollbar = self.create_treeview(status_frame, ['Key ID', 'Status', 'Student ID'])
         notebook.add(status_frame, text='Status')
 
+        # Drive the status tree from the scrollbar so only a window of rows
+        # is ever inserted into Tk
+        self.status_scrollbar.configure(command=self._on_status_scroll)
+        self.status_tree.configure(yscrollcommand='')
+
         # Set default tab to Log
         notebook.select(log_frame)
 
@@ -265,57 +333,112 @@ class LibraryKeyManagementGUI:
         # Pack the scrollbar to the right
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
 
-        return tree
+        return tree, scrollbar
 
     def process_input(self):
-        input_id = self.input_entry.get().strip()
+        input_id = self.input_var.get().strip()
         if input_id:
+            # Skip identical re-sends arriving within a short window
+            now = time.monotonic()
+            if input_id == self._last_input and now - self._last_input_time < 0.5:
+                self._last_input_time = now
+                return
+            self._last_input = input_id
+            self._last_input_time = now
+
             if self.is_valid_student_id(input_id):
                 result = self.system._process_student_id(input_id)
                 self.current_student_id = input_id  # Set the current student ID
             elif self.is_valid_key_id(input_id):
                 if self.current_student_id:
-                    result = self.system._process_key_id(input_id)
+                    result = self.system._process_key_id(self._parsed_key_id)
                 else:
                     result = "Error: No student ID scanned. Please scan a student ID first."
             else:
                 result = "Error: Invalid ID format. Please enter a valid student ID or key ID."
 
             self.message_var.set(result)
-            self.input_entry.delete(0, tk.END)
+            self.input_var.set("")
             self.refresh_data()
 
     def is_valid_student_id(self, student_id):
-        return bool(re.match(r'^\d{8}$', student_id))
+        return bool(_STUDENT_ID_RE.match(student_id))
 
     def is_valid_key_id(self, key_id):
-        return key_id.isdigit() and FIRST_KEY_ID <= int(key_id) <= LAST_KEY_ID
+        # Parse in one pass and keep the value so process_input doesn't re-parse
+        if not 1 <= len(key_id) <= _MAX_KEY_ID_LEN:
+            return False
+        try:
+            value = int(key_id)
+        except ValueError:
+            return False
+        if FIRST_KEY_ID <= value <= LAST_KEY_ID:
+            self._parsed_key_id = value
+            return True
+        return False
 
     def refresh_data(self):
-        # Clear current entries in the status tree
-        for i in self.status_tree.get_children():
-            self.status_tree.delete(i)
-
-        # Get filter selection
+        # Schedule one refresh on the event loop; repeat calls within the
+        # window are coalesced so rapid scans don't rebuild the trees N times
+        if not self._refresh_pending:
+            self._refresh_pending = True
+            self.master.after(50, self._do_refresh)
+
+    def _do_refresh(self):
+        self._refresh_pending = False
+        self.refresh_status()
+        self.refresh_log()
+
+    def refresh_status(self):
+        # Get status data, filtered at the source in a single pass
         filter_value = self.filter_var.get()
+        status_data = self.system.get_status(None if filter_value == "All" else filter_value)
+
+        # Cache the full list and render only the visible window
+        self._status_data = status_data
+        max_offset = max(len(self._status_data) - STATUS_WINDOW_SIZE, 0)
+        self._status_offset = min(self._status_offset, max_offset)
+        self._render_status_window()
+
+    def refresh_log(self):
+        # Clear current entries in the log tree in one Tcl call
+        children = self.log_tree.get_children()
+        if children:
+            self.log_tree.delete(*children)
+        for row in self.system.get_log():
+            self.log_tree.insert('', 'end', values=row)
 
-        # Get status data based on filter
-        if filter_value == "All":
-            status_data = self.system.get_status()  # Retrieve all entries
-        elif filter_value == "Borrowed":
-            status_data = [row for row in self.system.get_status() if row[1] == 'Borrowed']
-        elif filter_value == "Available":
-            status_data = [row for row in self.system.get_status() if row[1] == 'Available']
-        
-        for row in status_data:
-            key_id, status, student_id = row
+    def _render_status_window(self):
+        """Insert only the window of status rows around the current offset."""
+        children = self.status_tree.get_children()
+        if children:
+            self.status_tree.delete(*children)
+
+        total = len(self._status_data)
+        start = self._status_offset
+        end = min(start + STATUS_WINDOW_SIZE, total)
+        for key_id, status, student_id in self._status_data[start:end]:
             self.status_tree.insert('', 'end', values=(key_id, status, student_id or "N/A"))
 
-        # Clear current entries in the log tree
-        for i in self.log_tree.get_children():
-            self.log_tree.delete(i)
-        for row in self.system.get_log():
-            self.log_tree.insert('', 'end', values=row)
+        # Reflect the window position in the scrollbar
+        if total > 0:
+            self.status_scrollbar.set(start / total, end / total)
+        else:
+            self.status_scrollbar.set(0.0, 1.0)
+
+    def _on_status_scroll(self, action, amount, units=None):
+        """Scrollbar callback: move the window and re-render the visible slice."""
+        total = len(self._status_data)
+        max_offset = max(total - STATUS_WINDOW_SIZE, 0)
+        if action == 'moveto':
+            offset = round(float(amount) * total)
+        else:  # 'scroll' by units or pages
+            step = STATUS_WINDOW_SIZE if units == 'pages' else 1
+            offset = self._status_offset + int(amount) * step
+        offset = min(max(offset, 0), max_offset)
+        if offset != self._status_offset:
+            self._status_offset = offset
+            self._render_status_window()
 
 if __name__ == "__main__":
     root = tk.Tk()